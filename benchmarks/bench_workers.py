@@ -0,0 +1,208 @@
+"""
+Бенчмарк масштабирования API по числу воркеров gunicorn.
+
+Для каждого N от 1 до --max-workers запускает gunicorn с WEB_CONCURRENCY=N,
+закреплённый за N ядрами, нагружает /predict из клиентских процессов,
+закреплённых за ядрами, оставшимися после --max-workers (одинаковыми для
+всех N), и выводит пропускную способность, латентность и память воркеров
+(RSS, а также USS/PSS, по которым видно разделение страниц модели через
+copy-on-write). По умолчанию под сервер отводится половина доступных ядер.
+
+С --shadow-rate R каждый запуск повторяется с SHADOW_SAMPLE_RATE=0 и R, чтобы
+сравнить p99 основного пути с выключенным и включённым теневым скорингом
+(нужна загруженная challenger модель: алиас в MLflow или CHALLENGER_MODEL_PATH).
+
+Пример:
+    MODEL_PATH=models/price_predict.cbm python benchmarks/bench_workers.py --max-workers 4
+    MODEL_PATH=models/price_predict.cbm CHALLENGER_MODEL_PATH=models/price_predict.cbm \
+        python benchmarks/bench_workers.py --max-workers 2 --shadow-rate 0.1
+"""
+import argparse
+import functools
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+import numpy as np
+import psutil
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(CURRENT_DIR)
+GUNICORN_CONFIG = os.path.join(PROJECT_DIR, "configs", "gunicorn.conf.py")
+
+
+@functools.lru_cache(maxsize=None)
+def available_cpus():
+    """available_cpus() из конфига gunicorn, без изменения окружения бенчмарка"""
+    environ = dict(os.environ)
+    try:
+        spec = importlib.util.spec_from_file_location("gunicorn_conf", GUNICORN_CONFIG)
+        config = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(config)
+        # Конфиг создаёт временный каталог метрик, бенчмарку он не нужен
+        if config.OWNS_STATS_DIR:
+            os.rmdir(os.environ["STATS_DIR"])
+        return config.available_cpus()
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+PAYLOAD = {
+    "customer_tier": "A",
+    "material": "steel",
+    "thickness_mm": 2.5,
+    "length_mm": 1000.0,
+    "width_mm": 500.0,
+    "holes_count": 10,
+    "bends_count": 5,
+    "weld_length_mm": 200.0,
+    "cut_length_mm": 1500.0,
+    "route": "laser_cut",
+    "tolerance": "standard",
+    "surface_finish": "paint",
+    "coating": "powder",
+    "qty": 100,
+    "due_days": 14,
+    "engineer_score": 7.5,
+    "part_weight_kg": 15.5
+}
+
+
+def split_cpus(workers, max_workers):
+    """Ядра под сервер (по одному на воркер) и фиксированный набор ядер под клиентов нагрузки"""
+    cpus = sorted(os.sched_getaffinity(0))[:available_cpus()]
+    if max_workers >= len(cpus):
+        raise ValueError(f"{max_workers} workers leave no cores for load clients ({len(cpus)} available)")
+    return cpus[:workers], cpus[max_workers:]
+
+
+def start_server(workers, port, server_cpus, extra_env=None):
+    """Запуск gunicorn с заданным числом воркеров, закреплённого за server_cpus"""
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), **(extra_env or {})}
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "src.api:app",
+            "-c", GUNICORN_CONFIG,
+            "--bind", f"127.0.0.1:{port}",
+        ],
+        cwd=PROJECT_DIR,
+        env=env,
+        # Affinity наследуется master процессом и всеми воркерами
+        preexec_fn=lambda: os.sched_setaffinity(0, server_cpus),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(url, workers, master_pid, timeout=120):
+    """Ожидание загрузки модели и запуска всех воркеров"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            health = httpx.get(f"{url}/health", timeout=1).json()
+            if not health["model_loaded"]:
+                raise RuntimeError("Model not loaded, check MODEL_PATH or MLflow settings")
+            if len(psutil.Process(master_pid).children()) == workers:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError("Server did not start in time")
+
+
+def run_client(url, duration):
+    """Клиент, отправляющий запросы последовательно в течение duration секунд"""
+    latencies = []
+    with httpx.Client(timeout=10) as client:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.post(f"{url}/predict", json=PAYLOAD)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def workers_memory(master_pid):
+    """Память воркеров в МБ: средние RSS, USS и PSS"""
+    rss, uss, pss = [], [], []
+    for child in psutil.Process(master_pid).children():
+        info = child.memory_full_info()
+        rss.append(info.rss)
+        uss.append(info.uss)
+        pss.append(getattr(info, "pss", 0))
+    mb = 2**20
+    return np.mean(rss) / mb, np.mean(uss) / mb, np.mean(pss) / mb
+
+
+def shadow_enabled(url):
+    return httpx.get(f"{url}/shadow/stats", timeout=1).json()["enabled"]
+
+
+def benchmark(workers, args, shadow_rate=None):
+    url = f"http://127.0.0.1:{args.port}"
+    server_cpus, client_cpus = split_cpus(workers, args.max_workers)
+    extra_env = None if shadow_rate is None else {"SHADOW_SAMPLE_RATE": str(shadow_rate)}
+    server = start_server(workers, args.port, server_cpus, extra_env)
+    try:
+        wait_ready(url, workers, server.pid)
+        if shadow_rate and not shadow_enabled(url):
+            raise RuntimeError("Shadow scoring is disabled, challenger model not loaded")
+        clients = args.clients_per_worker * workers
+        with ProcessPoolExecutor(
+            max_workers=clients, initializer=os.sched_setaffinity, initargs=(0, client_cpus)
+        ) as pool:
+            futures = [pool.submit(run_client, url, args.duration) for _ in range(clients)]
+            latencies = np.concatenate([f.result() for f in futures])
+        rss, uss, pss = workers_memory(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "workers": workers,
+        "client_cpus": len(client_cpus),
+        "shadow_rate": shadow_rate,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": np.percentile(latencies, 50) * 1000,
+        "p99_ms": np.percentile(latencies, 99) * 1000,
+        "rss_mb": rss,
+        "uss_mb": uss,
+        "pss_mb": pss,
+    }
+
+
+def main(args_list=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=max(1, available_cpus() // 2), help="Maximum number of workers")
+    parser.add_argument("--duration", type=float, default=15, help="Load duration per run, seconds")
+    parser.add_argument("--clients-per-worker", type=int, default=4, help="Concurrent clients per worker")
+    parser.add_argument("--port", type=int, default=8001, help="Port for the benchmarked server")
+    parser.add_argument("--shadow-rate", type=float, default=None, help="Compare p99 with shadow scoring off and at this rate")
+    args = parser.parse_args(args_list)
+
+    print(f"{'workers':>7} {'client cores':>12} {'shadow':>6} {'rps':>9} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'USS MB':>8} {'PSS MB':>8}")
+    base_rps = None
+    for workers in range(1, args.max_workers + 1):
+        shadow_rates = [None] if args.shadow_rate is None else [0.0, args.shadow_rate]
+        results = [benchmark(workers, args, rate) for rate in shadow_rates]
+        for result in results:
+            base_rps = base_rps or result["rps"]
+            shadow = "-" if result["shadow_rate"] is None else f"{result['shadow_rate']:.2f}"
+            print(
+                f"{result['workers']:>7} {result['client_cpus']:>12} {shadow:>6} {result['rps']:>9.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['rss_mb']:>8.1f} {result['uss_mb']:>8.1f} {result['pss_mb']:>8.1f}"
+                f"   x{result['rps'] / base_rps:.2f}"
+            )
+        if len(results) == 2:
+            off, on = results
+            print(f"{'':>20} shadow p99 delta: {on['p99_ms'] - off['p99_ms']:+.2f} ms ({(on['p99_ms'] / off['p99_ms'] - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import gc
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from worker_stats import WorkerStatsStore
+
+
+def cgroup_cpu_quota():
+    """Квота CPU контейнера в ядрах (cgroup v2 или v1) или None, если не ограничена"""
+    # cgroup v2: "200000 100000" -> 2 ядра, "max 100000" - без ограничения
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1: cpu.cfs_quota_us = -1 - без ограничения
+    for directory in ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct"):
+        try:
+            with open(os.path.join(directory, "cpu.cfs_quota_us")) as f:
+                quota = int(f.read())
+            with open(os.path.join(directory, "cpu.cfs_period_us")) as f:
+                period = int(f.read())
+        except (OSError, ValueError):
+            continue
+        return None if quota <= 0 or period <= 0 else quota / period
+
+    return None
+
+
+def available_cpus():
+    """Количество доступных ядер с учётом affinity и квоты cgroup"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+
+    return cpus
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or available_cpus()
+
+# Конфиг выполняется в master до загрузки приложения: число воркеров нужно API
+# для деления бюджета кэша моделей, каталог - для объединения метрик воркеров
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Собственный временный каталог удаляется целиком при выходе; в каталоге,
+# заданном через STATS_DIR, удаляются только файлы метрик
+OWNS_STATS_DIR = "STATS_DIR" not in os.environ
+if OWNS_STATS_DIR:
+    os.environ["STATS_DIR"] = tempfile.mkdtemp(prefix="price-api-stats-")
+
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120
+
+# Модель загружается один раз в master процессе до fork,
+# воркеры разделяют страницы памяти с моделью через copy-on-write
+preload_app = True
+
+
+def on_starting(server):
+    # Метрики предыдущего запуска с тем же STATS_DIR не должны попасть в сумму
+    WorkerStatsStore(os.environ["STATS_DIR"]).clear()
+
+
+def on_exit(server):
+    WorkerStatsStore(os.environ["STATS_DIR"]).clear()
+    if OWNS_STATS_DIR:
+        shutil.rmtree(os.environ["STATS_DIR"], ignore_errors=True)
+
+
+def when_ready(server):
+    # Переносим уже созданные объекты в постоянное поколение, чтобы сборщик
+    # мусора в воркерах не трогал их заголовки и не копировал страницы
+    gc.collect()
+    gc.freeze()
+
+    api = sys.modules.get("src.api")
+    model_loader = getattr(api, "model_loader", None)
+    if model_loader is None or model_loader.model is None:
+        server.log.warning(f"Model not loaded in master, {server.num_workers} workers will return 503 on /predict")
+        return
+
+    server.log.info(
+        f"Model preloaded (shadow scoring: {'on' if model_loader.shadow_scorer else 'off'}, "
+        f"drift monitoring: {'on' if model_loader.drift_monitor else 'off'}), "
+        f"starting {server.num_workers} workers"
+    )
@@ -1,14 +1,25 @@
 import sys
 import os
+from contextlib import asynccontextmanager
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 import pandas as pd
 import numpy as np
 import logging
+import json
+import time
+import threading
+from catboost import CatBoostRegressor
+from mlflow.exceptions import MlflowException
 from mlflow_manage import MLflowManager
 from schemas import PredictionRequest, PredictionResponse
+from shadow import ShadowScorer
+from model_cache import ModelCache, ModelNotFoundError
+from drift import DriftMonitor
+from worker_stats import WorkerStatsStore, StatsPublisher
 
 # Настройка логирования
 logging.basicConfig(
@@ -23,54 +34,196 @@ app = FastAPI(title="Price Prediction API", version="1.0.0")
 # Глобальные переменные для модели
 MODEL_NAME = "price_predict"
 MODEL_ALIAS = "production"
+CHALLENGER_ALIAS = os.getenv("CHALLENGER_ALIAS", "challenger")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
 EXPERIMENT_NAME = "technopark-test-task"
+# Локальный .cbm файл вместо загрузки из MLflow (например, models/price_predict.cbm)
+MODEL_PATH = os.getenv("MODEL_PATH")
+# Локальный .cbm файл challenger модели для теневого скоринга в режиме MODEL_PATH
+CHALLENGER_MODEL_PATH = os.getenv("CHALLENGER_MODEL_PATH")
+# Общий бюджет кэша моделей на под, делится между воркерами gunicorn
+MODEL_CACHE_MAX_MB = float(os.getenv("MODEL_CACHE_MAX_MB", "1024"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Модели реестра, загружаемые до fork ("name@alias,name@alias")
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "")
+# Каталог для объединения метрик воркеров (задаётся конфигом gunicorn)
+STATS_DIR = os.getenv("STATS_DIR")
+STATS_PUBLISH_INTERVAL = float(os.getenv("STATS_PUBLISH_INTERVAL", "5"))
+DRIFT_BATCH_SIZE = int(os.getenv("DRIFT_BATCH_SIZE", "64"))
 
 class ModelLoader:
     def __init__(self):
         self.mlflow_manager = None
         self.model = None
+        self._mlflow_lock = threading.Lock()
+        self.shadow_scorer = None
+        self.drift_monitor = None
 
         self.load_production_model()
+        self.load_challenger_model()
+        self.load_drift_monitor()
     
     def load_production_model(self):
-        """Загрузка production модели из MLflow"""
+        """Загрузка production модели из MLflow или локального .cbm файла"""
         try:
-            self.mlflow_manager = MLflowManager(experiment_name=EXPERIMENT_NAME, model_name=MODEL_NAME)
+            if MODEL_PATH:
+                self.model = CatBoostRegressor().load_model(MODEL_PATH)
+                logger.info(f"Successfully loaded model from file: {MODEL_PATH}")
+                logger.info("MODEL_PATH mode: /predict/{model_name} still loads other registry models from MLflow")
+                return True
+
             # Загрузка модели
-            self.model = self.mlflow_manager.load_model(model_name=MODEL_NAME, alias=MODEL_ALIAS)
+            self.model = self.get_mlflow_manager().load_model(model_name=MODEL_NAME, alias=MODEL_ALIAS)
             return True
             
         except Exception as e:
             logger.error(f"Failed to load model: {str(e)}")
             return False
 
+    def get_mlflow_manager(self):
+        """MLflowManager, создаваемый один раз на процесс"""
+        with self._mlflow_lock:
+            if self.mlflow_manager is None:
+                self.mlflow_manager = MLflowManager(experiment_name=EXPERIMENT_NAME, model_name=MODEL_NAME)
+            return self.mlflow_manager
+
+    def load_challenger_model(self):
+        """Загрузка challenger модели для теневого скоринга"""
+        if self.model is None or SHADOW_SAMPLE_RATE <= 0:
+            return False
+        if MODEL_PATH and not CHALLENGER_MODEL_PATH:
+            logger.info("MODEL_PATH mode without CHALLENGER_MODEL_PATH, shadow scoring disabled")
+            return False
+        try:
+            if MODEL_PATH:
+                challenger = CatBoostRegressor().load_model(CHALLENGER_MODEL_PATH)
+            else:
+                challenger = self.mlflow_manager.load_model(model_name=MODEL_NAME, alias=CHALLENGER_ALIAS)
+            self.shadow_scorer = ShadowScorer(challenger, sample_rate=SHADOW_SAMPLE_RATE)
+            return True
+
+        except Exception as e:
+            logger.warning(f"Challenger model not loaded, shadow scoring disabled: {str(e)}")
+            return False
+
+    def load_drift_monitor(self):
+        """Загрузка референсного профиля production модели для мониторинга дрейфа"""
+        if self.model is None:
+            return False
+        try:
+            if MODEL_PATH:
+                profile_path = os.path.splitext(MODEL_PATH)[0] + "_reference_profile.json"
+                with open(profile_path) as f:
+                    profile = json.load(f)
+            else:
+                profile = self.mlflow_manager.load_reference_profile(model_name=MODEL_NAME, alias=MODEL_ALIAS)
+            self.drift_monitor = DriftMonitor(profile, batch_size=DRIFT_BATCH_SIZE)
+            return True
+
+        except Exception as e:
+            logger.warning(f"Reference profile not loaded, drift monitoring disabled: {str(e)}")
+            return False
+
 model_loader = ModelLoader()
 
+# Коды ошибок MLflow для отсутствующей модели или алиаса
+MODEL_NOT_FOUND_CODES = ("RESOURCE_DOES_NOT_EXIST", "INVALID_PARAMETER_VALUE")
+
+def load_registry_model(model_name, alias):
+    """Загрузка произвольной модели из MLflow Model Registry"""
+    try:
+        return model_loader.get_mlflow_manager().load_model(model_name=model_name, alias=alias)
+    except MlflowException as e:
+        if e.error_code in MODEL_NOT_FOUND_CODES:
+            raise ModelNotFoundError(f"Model {model_name}@{alias} not found") from e
+        raise
+
+model_cache = ModelCache(load_registry_model, max_bytes=int(MODEL_CACHE_MAX_MB * 2**20 / max(WORKERS, 1)))
+# Production модель уже загружена ModelLoader, второй копии в кэше не нужно
+if model_loader.model is not None:
+    model_cache.pin(MODEL_NAME, MODEL_ALIAS, model_loader.model)
+
+def preload_registry_models():
+    """Загрузка моделей из PRELOAD_MODELS до fork, чтобы воркеры разделяли их память"""
+    for item in filter(None, (part.strip() for part in PRELOAD_MODELS.split(","))):
+        model_name, _, alias = item.partition("@")
+        alias = alias or MODEL_ALIAS
+        try:
+            model_cache.pin(model_name, alias, load_registry_model(model_name, alias))
+        except Exception as e:
+            logger.error(f"Failed to preload model {model_name}@{alias}: {str(e)}")
+
+preload_registry_models()
+
+stats_store = WorkerStatsStore(STATS_DIR) if STATS_DIR else None
+stats_publisher = None
+
+def collect_states(name, component):
+    """Состояние компонента по всем воркерам (или только текущего процесса).
+
+    Выполняет файловый ввод-вывод, поэтому эндпоинты метрик объявлены через def
+    и выполняются FastAPI в threadpool, а не в event loop.
+    """
+    state = component.get_state()
+    if stats_store is None:
+        return [state]
+    stats_store.publish(name, state)
+    return stats_store.collect(name, component.merge_states)
+
+@asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
         logger.info("Starting up Price Prediction API...")
         
         if model_loader.model is None:
             logger.error("Failed to load model on startup. Service will not be able to serve predictions.")
+
+        # Lifespan выполняется в каждом воркере после fork
+        global stats_publisher
+        if stats_store is not None:
+            sources = {"models": model_cache}
+            if model_loader.shadow_scorer is not None:
+                sources["shadow"] = model_loader.shadow_scorer
+            if model_loader.drift_monitor is not None:
+                sources["drift"] = model_loader.drift_monitor
+            stats_publisher = StatsPublisher(stats_store, sources, interval=STATS_PUBLISH_INTERVAL)
+            stats_publisher.start()
         
         logger.info("API startup completed")
         yield
     finally:
         logger.info("Shutting down Price Prediction API...")
+
+        if model_loader.shadow_scorer is not None:
+            model_loader.shadow_scorer.stop()
+
+        if stats_publisher is not None:
+            stats_publisher.stop()
         
         logger.info("API shutdown completed")
 
-app.lifespan = lifespan
+app.router.lifespan_context = lifespan
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
+async def predict(request: PredictionRequest, background_tasks: BackgroundTasks):
     """Эндпоинт для предсказания цены"""
     try:
         if model_loader.model is None:
             raise HTTPException(status_code=503, detail="Model not loaded")
         
-        input_df = pd.DataFrame([request.dict()])
+        features = request.dict()
+        input_df = pd.DataFrame([features])
         prediction = model_loader.model.predict(input_df)
+
+        # Теневой скоринг выполняется после отправки ответа
+        shadow_scorer = model_loader.shadow_scorer
+        if shadow_scorer is not None and shadow_scorer.should_sample():
+            background_tasks.add_task(shadow_scorer.submit, features, float(prediction[0]))
+
+        # Добавление в буфер O(1), гистограммы обновляются раз в DRIFT_BATCH_SIZE запросов;
+        # вызывается напрямую, без перехода в threadpool через BackgroundTasks
+        if model_loader.drift_monitor is not None:
+            model_loader.drift_monitor.observe(features)
         
         return PredictionResponse(
             prediction=float(prediction[0]),
@@ -81,6 +234,50 @@ async def predict(request: PredictionRequest):
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/predict/{model_name}", response_model=PredictionResponse)
+async def predict_by_model(model_name: str, request: PredictionRequest, alias: str = MODEL_ALIAS):
+    """Эндпоинт для предсказания цены выбранной моделью из реестра"""
+    start = time.perf_counter()
+    try:
+        model = await run_in_threadpool(model_cache.get, model_name, alias)
+    except ModelNotFoundError as e:
+        model_cache.record_request(model_name, alias, (time.perf_counter() - start) * 1000, error=True)
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        model_cache.record_request(model_name, alias, (time.perf_counter() - start) * 1000, error=True)
+        logger.error(f"Failed to load model {model_name}@{alias}: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Model {model_name}@{alias} not available")
+
+    try:
+        input_df = pd.DataFrame([request.dict()])
+        prediction = model.predict(input_df)
+        response = PredictionResponse(
+            prediction=float(prediction[0]),
+            status="success"
+        )
+
+    except Exception as e:
+        model_cache.record_request(model_name, alias, (time.perf_counter() - start) * 1000, error=True)
+        logger.error(f"Prediction error ({model_name}@{alias}): {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    model_cache.record_request(model_name, alias, (time.perf_counter() - start) * 1000)
+    return response
+
+@app.get("/models")
+def models_stats():
+    """Состояние кэша моделей и метрики по моделям"""
+    return model_cache.stats_from_states(collect_states("models", model_cache))
+
+@app.get("/drift")
+def drift():
+    """Оценки дрейфа входных признаков относительно обучающей выборки"""
+    if model_loader.drift_monitor is None:
+        return {"enabled": False}
+
+    drift_monitor = model_loader.drift_monitor
+    return {"enabled": True, **drift_monitor.drift_from_states(collect_states("drift", drift_monitor))}
+
 @app.get("/health")
 async def health_check():
     """Health check эндпоинт"""
@@ -90,6 +287,18 @@ async def health_check():
         "model_loaded": model_loader.model is not None
     }
 
+@app.get("/shadow/stats")
+def shadow_stats():
+    """Статистика расхождения challenger модели с production"""
+    if model_loader.shadow_scorer is None:
+        return {"enabled": False, "challenger_alias": CHALLENGER_ALIAS}
+
+    return {
+        "enabled": True,
+        "challenger_alias": CHALLENGER_ALIAS,
+        **model_loader.shadow_scorer.stats_from_states(collect_states("shadow", model_loader.shadow_scorer))
+    }
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,251 @@
+import math
+import threading
+import logging
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PSI_EPS = 1e-4
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+
+def build_reference_profile(df, num_features, cat_features, n_bins=10):
+    """Построение референсного профиля признаков на обучающей выборке"""
+    profile = {"n_samples": len(df), "numerical": {}, "categorical": {}}
+
+    for col in num_features:
+        values = df[col].dropna().to_numpy(dtype=float)
+        quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+        edges = np.unique(np.quantile(values, quantiles))
+        counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+        profile["numerical"][col] = {
+            "edges": edges.tolist(),
+            "probs": (counts / max(len(values), 1)).tolist(),
+        }
+
+    for col in cat_features:
+        frequencies = df[col].astype(str).value_counts(normalize=True)
+        profile["categorical"][col] = {
+            "frequencies": {str(k): float(v) for k, v in frequencies.items()},
+        }
+
+    return profile
+
+
+def psi(expected, actual):
+    """Population Stability Index между двумя распределениями"""
+    expected = np.clip(np.asarray(expected, dtype=float), PSI_EPS, None)
+    actual = np.clip(np.asarray(actual, dtype=float), PSI_EPS, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def drift_level(value):
+    if value >= PSI_SIGNIFICANT:
+        return "significant"
+    if value >= PSI_MODERATE:
+        return "moderate"
+    return "none"
+
+
+class HeavyHitters:
+    """Счётчики частых значений по алгоритму Misra-Gries (не более k счётчиков)"""
+
+    def __init__(self, k=20):
+        self.k = k
+        self.counters = {}
+
+    def update(self, value, count=1):
+        if value in self.counters:
+            self.counters[value] += count
+        elif len(self.counters) < self.k:
+            self.counters[value] = count
+        else:
+            decrement = min(count, min(self.counters.values()))
+            for key in list(self.counters):
+                self.counters[key] -= decrement
+                if self.counters[key] <= 0:
+                    del self.counters[key]
+            if count > decrement:
+                self.update(value, count - decrement)
+
+    def top(self, n=None):
+        return sorted(self.counters.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class DriftMonitor:
+    """Потоковый мониторинг дрейфа входных признаков относительно референсного профиля"""
+
+    def __init__(self, reference_profile, batch_size=64, top_k=20):
+        self.reference_profile = reference_profile
+        self.batch_size = batch_size
+        self.top_k = top_k
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._count = 0
+        self._skipped = 0
+
+        self._num_edges = {}
+        self._num_counts = {}
+        for col, ref in reference_profile["numerical"].items():
+            self._num_edges[col] = np.asarray(ref["edges"], dtype=float)
+            self._num_counts[col] = np.zeros(len(ref["probs"]), dtype=np.int64)
+
+        # Известные категории считаются точно, новые - через heavy hitters
+        self._cat_counts = {}
+        self._cat_unseen = {}
+        self._cat_unseen_total = {}
+        for col, ref in reference_profile["categorical"].items():
+            self._cat_counts[col] = dict.fromkeys(ref["frequencies"], 0)
+            self._cat_unseen[col] = HeavyHitters(top_k)
+            self._cat_unseen_total[col] = 0
+
+    def observe(self, features):
+        """Добавление запроса в буфер; обработка выполняется батчами"""
+        with self._lock:
+            self._buffer.append(features)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def _is_valid(self, row):
+        """Проверка строки: числовые признаки конечны, категориальные приводятся к строке"""
+        if not isinstance(row, dict):
+            return False
+        for col in self._num_edges:
+            value = row.get(col)
+            if value is None:
+                continue
+            try:
+                if not math.isfinite(float(value)):
+                    return False
+            except (TypeError, ValueError):
+                return False
+        return True
+
+    def _flush(self):
+        batch, self._buffer = self._buffer, []
+        rows = [row for row in batch if self._is_valid(row)]
+        if len(rows) < len(batch):
+            self._skipped += len(batch) - len(rows)
+            logger.warning(f"Drift monitor skipped {len(batch) - len(rows)} invalid rows")
+        if not rows:
+            return
+
+        # Сначала считаем приращения по всему батчу, затем применяем их вместе,
+        # чтобы счётчики признаков и observed не расходились
+        num_increments = {}
+        for col, edges in self._num_edges.items():
+            values = np.array([float(row[col]) for row in rows if row.get(col) is not None], dtype=float)
+            bins = np.searchsorted(edges, values, side='right')
+            num_increments[col] = np.bincount(bins, minlength=len(edges) + 1)
+
+        cat_increments = {
+            col: Counter(str(row[col]) for row in rows if row.get(col) is not None)
+            for col in self._cat_counts
+        }
+
+        for col, increment in num_increments.items():
+            self._num_counts[col] += increment
+
+        for col, increment in cat_increments.items():
+            counts = self._cat_counts[col]
+            for value, count in increment.items():
+                if value in counts:
+                    counts[value] += count
+                else:
+                    self._cat_unseen[col].update(value, count)
+                    self._cat_unseen_total[col] += count
+
+        self._count += len(rows)
+
+    def get_state(self):
+        """Сырые счётчики для объединения между воркерами"""
+        with self._lock:
+            self._flush()
+            return {
+                "observed": self._count,
+                "skipped": self._skipped,
+                "num_counts": {col: counts.tolist() for col, counts in self._num_counts.items()},
+                "cat_counts": {col: dict(counts) for col, counts in self._cat_counts.items()},
+                "unseen_total": dict(self._cat_unseen_total),
+                "unseen": {col: dict(hitters.counters) for col, hitters in self._cat_unseen.items()},
+            }
+
+    def _merge_states(self, states):
+        merged = {
+            "observed": sum(state["observed"] for state in states),
+            "skipped": sum(state["skipped"] for state in states),
+            "num_counts": {col: np.zeros(len(counts), dtype=np.int64) for col, counts in self._num_counts.items()},
+            "cat_counts": {col: dict.fromkeys(counts, 0) for col, counts in self._cat_counts.items()},
+            "unseen_total": dict.fromkeys(self._cat_unseen_total, 0),
+            "unseen": {col: HeavyHitters(self.top_k) for col in self._cat_unseen},
+        }
+        for state in states:
+            for col, counts in state["num_counts"].items():
+                merged["num_counts"][col] += np.asarray(counts, dtype=np.int64)
+            for col, counts in state["cat_counts"].items():
+                for value, count in counts.items():
+                    merged["cat_counts"][col][value] += count
+            for col, total in state["unseen_total"].items():
+                merged["unseen_total"][col] += total
+            for col, counters in state["unseen"].items():
+                for value, count in counters.items():
+                    merged["unseen"][col].update(value, count)
+        return merged
+
+    def merge_states(self, states):
+        """Объединение состояний в одно (для счётчиков завершившихся воркеров)"""
+        merged = self._merge_states(states)
+        return {
+            "observed": merged["observed"],
+            "skipped": merged["skipped"],
+            "num_counts": {col: counts.tolist() for col, counts in merged["num_counts"].items()},
+            "cat_counts": merged["cat_counts"],
+            "unseen_total": merged["unseen_total"],
+            "unseen": {col: dict(hitters.counters) for col, hitters in merged["unseen"].items()},
+        }
+
+    def drift_from_states(self, states):
+        """Оценки дрейфа по состояниям одного или нескольких воркеров"""
+        merged = self._merge_states(states)
+        result = {
+            "workers": sum(1 for state in states if state.get("alive", True)),
+            "observed": merged["observed"],
+            "skipped": merged["skipped"],
+            "numerical": {},
+            "categorical": {},
+        }
+
+        for col, counts in merged["num_counts"].items():
+            total = counts.sum()
+            if total == 0:
+                continue
+            score = psi(self.reference_profile["numerical"][col]["probs"], counts / total)
+            result["numerical"][col] = {"psi": score, "drift": drift_level(score)}
+
+        for col, counts in merged["cat_counts"].items():
+            unseen_total = merged["unseen_total"][col]
+            total = sum(counts.values()) + unseen_total
+            if total == 0:
+                continue
+            reference = self.reference_profile["categorical"][col]["frequencies"]
+            expected = [reference[value] for value in counts] + [0.0]
+            actual = [counts[value] / total for value in counts] + [unseen_total / total]
+            score = psi(expected, actual)
+            result["categorical"][col] = {
+                "psi": score,
+                "drift": drift_level(score),
+                "unseen_share": unseen_total / total,
+                "unseen_top": dict(merged["unseen"][col].top(5)),
+            }
+
+        scores = [v["psi"] for group in ("numerical", "categorical") for v in result[group].values()]
+        result["max_psi"] = max(scores) if scores else None
+        result["drift"] = drift_level(result["max_psi"]) if scores else "none"
+        return result
+
+    def get_drift(self):
+        """Оценки дрейфа по признакам (PSI относительно обучающей выборки)"""
+        return self.drift_from_states([self.get_state()])
@@ -3,6 +3,8 @@ import logging
 from dotenv import load_dotenv
 import mlflow
 import mlflow.catboost
+import mlflow.artifacts
+from mlflow.tracking import MlflowClient
 from mlflow.models.signature import ModelSignature
 from mlflow.types.schema import Schema, ColSpec
 import pandas as pd
@@ -73,6 +75,10 @@ class MLflowManager:
         """Логирование артефактов"""
         mlflow.log_artifact(file_path)
     
+    def log_dict(self, dictionary, artifact_file):
+        """Логирование словаря как JSON артефакта"""
+        mlflow.log_dict(dictionary, artifact_file)
+    
     def end_run(self):
         """Завершение run"""
         mlflow.end_run()
@@ -92,4 +98,13 @@ class MLflowManager:
         except Exception as e:
             logger.error(f"Failed to load model {model_name} from MLflow: {str(e)}")
             raise
-    
\ No newline at end of file
+    
+    def load_reference_profile(self, model_name=None, alias="production", artifact_file="reference_profile.json"):
+        """Загрузка референсного профиля признаков из run модели"""
+        model_name = model_name or self.model_name
+        
+        model_version = MlflowClient().get_model_version_by_alias(model_name, alias)
+        profile_uri = f"runs:/{model_version.run_id}/{artifact_file}"
+        logger.info(f"Loading reference profile from: {profile_uri}")
+        
+        return mlflow.artifacts.load_dict(profile_uri)
@@ -7,6 +7,7 @@ from mlflow.models.signature import infer_signature
 import logging
 
 from data_proccessing import DataProcessor
+from drift import build_reference_profile
 
 logger = logging.getLogger('technopark-test-task')
 
@@ -20,6 +21,7 @@ class PricePredictor:
         self.data_processor = None
         self.cat_features = None
         self.id_feature = None
+        self.reference_profile = None
         
     def train(self, mlflow_manager, df, cat_features, id_feature = 'rfq_id', target='target_unit_price_rub', test_size=0.2, random_state=42):
         """Обучение модели"""
@@ -88,6 +90,12 @@ class PricePredictor:
 
         mlflow_manager.log_metrics(metrics)
             
+        # Референсный профиль признаков для мониторинга дрейфа
+        self.reference_profile = build_reference_profile(
+            X_train, self.data_processor.num_features, self.data_processor.cat_features
+        )
+        mlflow_manager.log_dict(self.reference_profile, "reference_profile.json")
+            
         # Создание сигнатуры модели
         signature = infer_signature(X_train, self.model.predict(X_train))
             
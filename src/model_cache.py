@@ -0,0 +1,273 @@
+import os
+import pickle
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_model_size(model):
+    """Оценка размера модели в памяти по её сериализованному представлению"""
+    try:
+        return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(model)
+
+
+class ModelMetrics:
+    """Метрики обслуживания одной модели"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.last_load_ms = None
+
+    def merge(self, state):
+        """Добавление сырых счётчиков другого воркера"""
+        for name in ("requests", "errors", "total_latency_ms", "hits", "misses", "loads", "evictions"):
+            setattr(self, name, getattr(self, name) + state[name])
+        self.max_latency_ms = max(self.max_latency_ms, state["max_latency_ms"])
+        if state["last_load_ms"] is not None:
+            self.last_load_ms = max(self.last_load_ms or 0.0, state["last_load_ms"])
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_ms": self.total_latency_ms / self.requests if self.requests else None,
+            "max_latency_ms": self.max_latency_ms if self.requests else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "last_load_ms": self.last_load_ms,
+        }
+
+
+class ModelNotFoundError(LookupError):
+    """Модель или алиас отсутствуют в реестре"""
+
+
+def fresh_exception(error):
+    """Новый экземпляр исключения, чтобы повторные raise не наращивали общий __traceback__"""
+    try:
+        return type(error)(*error.args)
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+class ModelCache:
+    """LRU кэш моделей по ключу (имя, алиас) с ограничением по памяти"""
+
+    def __init__(self, loader, max_bytes, size_fn=estimate_model_size, failure_ttl=30.0, max_failures=1024):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self.failure_ttl = failure_ttl
+        self.max_failures = max_failures
+
+        self._lock = threading.Lock()
+        self._models = OrderedDict()
+        self._pinned = {}
+        self._in_flight = {}
+        self._metrics = {}
+        self._total_bytes = 0
+
+        # Неудачные загрузки кэшируются на failure_ttl секунд, число ключей ограничено
+        self._failures = OrderedDict()
+        self._load_errors = 0
+        self._negative_hits = 0
+        self._rejected_requests = 0
+
+    def pin(self, model_name, alias, model):
+        """Добавление уже загруженной модели, которая не вытесняется и не учитывается в бюджете"""
+        key = (model_name, alias)
+        with self._lock:
+            self._pinned[key] = model
+            self._get_metrics(key)
+
+    def get(self, model_name, alias):
+        """Получение модели; при промахе загрузка выполняется один раз на ключ"""
+        key = (model_name, alias)
+        with self._lock:
+            if key in self._pinned:
+                self._metrics[key].hits += 1
+                return self._pinned[key]
+
+            if key in self._models:
+                self._models.move_to_end(key)
+                self._metrics[key].hits += 1
+                return self._models[key][0]
+
+            failure = self._failures.get(key)
+            if failure is not None:
+                expires_at, error = failure
+                if time.monotonic() < expires_at:
+                    self._negative_hits += 1
+                    raise fresh_exception(error)
+                del self._failures[key]
+
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_owner:
+            try:
+                model = future.result()
+            except Exception as e:
+                raise fresh_exception(e) from None
+            with self._lock:
+                self._metrics[key].misses += 1
+            return model
+
+        try:
+            model = self._load(key)
+        except Exception as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._in_flight[key]
+        future.set_result(model)
+        return model
+
+    def _load(self, key):
+        start = time.perf_counter()
+        try:
+            model = self.loader(*key)
+        except Exception as e:
+            with self._lock:
+                self._load_errors += 1
+                # Храним копию без traceback, при каждом попадании создаётся новый экземпляр
+                self._failures[key] = (time.monotonic() + self.failure_ttl, fresh_exception(e))
+                self._failures.move_to_end(key)
+                while len(self._failures) > self.max_failures:
+                    self._failures.popitem(last=False)
+            raise
+        size = self.size_fn(model)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            # Метрики заводятся только для успешно загруженных моделей
+            metrics = self._get_metrics(key)
+            metrics.misses += 1
+            metrics.loads += 1
+            metrics.last_load_ms = load_ms
+            self._models[key] = (model, size)
+            self._total_bytes += size
+            self._evict(keep=key)
+
+        logger.info(f"Model {key[0]}@{key[1]} cached: {size / 2**20:.1f} MB, loaded in {load_ms:.0f} ms")
+        return model
+
+    def _evict(self, keep):
+        """Вытеснение наименее используемых моделей до укладывания в бюджет"""
+        while self._total_bytes > self.max_bytes and len(self._models) > 1:
+            key = next(iter(self._models))
+            if key == keep:
+                break
+            _, size = self._models.pop(key)
+            self._total_bytes -= size
+            self._metrics[key].evictions += 1
+            logger.info(f"Model {key[0]}@{key[1]} evicted from cache")
+
+    def _get_metrics(self, key):
+        if key not in self._metrics:
+            self._metrics[key] = ModelMetrics()
+        return self._metrics[key]
+
+    def record_request(self, model_name, alias, latency_ms, error=False):
+        """Учёт запроса к модели; запросы к незагруженным моделям считаются общим счётчиком"""
+        with self._lock:
+            metrics = self._metrics.get((model_name, alias))
+            if metrics is None:
+                self._rejected_requests += 1
+                return
+            metrics.requests += 1
+            metrics.total_latency_ms += latency_ms
+            metrics.max_latency_ms = max(metrics.max_latency_ms, latency_ms)
+            if error:
+                metrics.errors += 1
+
+    def get_state(self):
+        """Сырые счётчики и состояние кэша для объединения между воркерами"""
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "total_bytes": self._total_bytes,
+                "pinned": [
+                    {"model_name": name, "alias": alias}
+                    for name, alias in self._pinned
+                ],
+                "cached": [
+                    {"model_name": name, "alias": alias, "size_bytes": size}
+                    for (name, alias), (_, size) in self._models.items()
+                ],
+                "load_errors": self._load_errors,
+                "negative_cache_hits": self._negative_hits,
+                "rejected_requests": self._rejected_requests,
+                "models": {
+                    f"{name}@{alias}": vars(metrics).copy()
+                    for (name, alias), metrics in self._metrics.items()
+                },
+            }
+
+    def merge_states(self, states):
+        """Объединение состояний в одно (для счётчиков завершившихся воркеров)"""
+        models = {}
+        for state in states:
+            for key, metrics_state in state["models"].items():
+                models.setdefault(key, ModelMetrics()).merge(metrics_state)
+
+        return {
+            "max_bytes": self.max_bytes,
+            "total_bytes": 0,
+            "pinned": [],
+            "cached": [],
+            "load_errors": sum(state["load_errors"] for state in states),
+            "negative_cache_hits": sum(state["negative_cache_hits"] for state in states),
+            "rejected_requests": sum(state["rejected_requests"] for state in states),
+            "models": {key: vars(metrics).copy() for key, metrics in models.items()},
+        }
+
+    def stats_from_states(self, states):
+        """Состояние кэшей и метрики по моделям по одному или нескольким воркерам"""
+        live_states = [state for state in states if state.get("alive", True)]
+        models = {}
+        for state in states:
+            for key, metrics_state in state["models"].items():
+                models.setdefault(key, ModelMetrics()).merge(metrics_state)
+
+        return {
+            "workers": len(live_states),
+            "max_bytes_per_worker": self.max_bytes,
+            "total_bytes": sum(state["total_bytes"] for state in live_states),
+            "pinned": live_states[0]["pinned"] if live_states else [],
+            "cached": [
+                {**item, "worker": state.get("pid", os.getpid())}
+                for state in live_states
+                for item in state["cached"]
+            ],
+            "load_errors": sum(state["load_errors"] for state in states),
+            "negative_cache_hits": sum(state["negative_cache_hits"] for state in states),
+            "rejected_requests": sum(state["rejected_requests"] for state in states),
+            "models": {key: metrics.to_dict() for key, metrics in models.items()},
+        }
+
+    def get_stats(self):
+        """Состояние кэша и метрики по моделям"""
+        return self.stats_from_states([self.get_state()])
@@ -0,0 +1,145 @@
+import queue
+import random
+import threading
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowScorer:
+    """Теневой скоринг challenger-модели на части трафика /predict"""
+
+    def __init__(self, model, sample_rate=0.1, batch_size=32, max_queue_size=10000, flush_interval=1.0):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stop_event = threading.Event()
+
+        self._count = 0
+        self._abs_pct_sum = 0.0
+        self._pct_sum = 0.0
+        self._max_abs_pct = 0.0
+        self._dropped = 0
+        self._errors = 0
+
+    def should_sample(self):
+        """Решение, отправлять ли запрос в теневой скоринг"""
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def submit(self, features, primary_prediction):
+        """Постановка запроса в очередь без ожидания скоринга"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((features, primary_prediction))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def _ensure_worker(self):
+        """Ленивый запуск фонового потока (в т.ч. после fork)"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stop_event.clear()
+            self._worker = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout=5.0):
+        """Остановка фонового потока с обработкой остатка очереди"""
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout=timeout)
+
+    def _run(self):
+        while not self._stop_event.is_set() or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._score_batch(batch)
+
+    def _score_batch(self, batch):
+        """Скоринг батча challenger-моделью и обновление статистик"""
+        try:
+            features, primary = zip(*batch)
+            input_df = pd.DataFrame(list(features))
+            # Один поток, чтобы не отнимать ядра у основного инференса
+            challenger = np.asarray(self.model.predict(input_df, thread_count=1), dtype=float)
+            self._update_stats(np.asarray(primary, dtype=float), challenger)
+        except Exception as e:
+            logger.error(f"Shadow scoring error: {str(e)}")
+            with self._lock:
+                self._errors += len(batch)
+
+    def _update_stats(self, primary, challenger):
+        """Накопление MAPE-подобного расхождения challenger относительно production"""
+        mask = primary != 0
+        pct = (challenger[mask] - primary[mask]) / np.abs(primary[mask]) * 100
+        if pct.size == 0:
+            return
+        abs_pct = np.abs(pct)
+        with self._lock:
+            self._count += int(pct.size)
+            self._abs_pct_sum += float(abs_pct.sum())
+            self._pct_sum += float(pct.sum())
+            self._max_abs_pct = max(self._max_abs_pct, float(abs_pct.max()))
+
+    def get_state(self):
+        """Сырые счётчики для объединения между воркерами"""
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "count": self._count,
+                "abs_pct_sum": self._abs_pct_sum,
+                "pct_sum": self._pct_sum,
+                "max_abs_pct": self._max_abs_pct,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "queued": self._queue.qsize(),
+            }
+
+    def merge_states(self, states):
+        """Объединение состояний в одно (для счётчиков завершившихся воркеров)"""
+        return {
+            "sample_rate": self.sample_rate,
+            "count": sum(state["count"] for state in states),
+            "abs_pct_sum": sum(state["abs_pct_sum"] for state in states),
+            "pct_sum": sum(state["pct_sum"] for state in states),
+            "max_abs_pct": max((state["max_abs_pct"] for state in states), default=0.0),
+            "dropped": sum(state["dropped"] for state in states),
+            "errors": sum(state["errors"] for state in states),
+            "queued": 0,
+        }
+
+    def stats_from_states(self, states):
+        """Статистики расхождения по состояниям одного или нескольких воркеров"""
+        count = sum(state["count"] for state in states)
+        return {
+            "sample_rate": self.sample_rate,
+            "workers": sum(1 for state in states if state.get("alive", True)),
+            "scored": count,
+            "queued": sum(state["queued"] for state in states if state.get("alive", True)),
+            "dropped": sum(state["dropped"] for state in states),
+            "errors": sum(state["errors"] for state in states),
+            "mape_divergence": sum(state["abs_pct_sum"] for state in states) / count if count else None,
+            "mean_pct_bias": sum(state["pct_sum"] for state in states) / count if count else None,
+            "max_abs_pct_divergence": max(state["max_abs_pct"] for state in states) if count else None,
+        }
+
+    def get_stats(self):
+        """Текущие статистики расхождения"""
+        return self.stats_from_states([self.get_state()])
@@ -1,5 +1,6 @@
 import pandas as pd
 import argparse
+import json
 import os
 import logging
 from model import PricePredictor
@@ -53,6 +54,11 @@ def main(args_list=None):
         model.save_model(model_path)
         logger.info(f"Модель сохранена в {model_path}")
         
+        profile_path = os.path.join(models_dir, f"{args.model_name}_reference_profile.json")
+        with open(profile_path, "w") as f:
+            json.dump(predictor.reference_profile, f)
+        logger.info(f"Референсный профиль сохранен в {profile_path}")
+        
     except Exception as e:
         logger.error(f"Произошла ошибка: {e}")
         raise
@@ -0,0 +1,162 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Суффикс файла с объединёнными счётчиками завершившихся воркеров
+DEAD_WORKERS = "dead"
+
+
+def process_start_time(pid):
+    """Время запуска процесса (поле starttime из /proc/<pid>/stat) или None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+        # Имя процесса в скобках может содержать пробелы, поля считаем после ")"
+        return int(stat.rsplit(")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def worker_alive(pid, start_time):
+    """Жив ли именно тот процесс, что записал файл (pid мог быть переиспользован)"""
+    if not start_time:
+        return pid_alive(pid)
+    return process_start_time(pid) == start_time
+
+
+class WorkerStatsStore:
+    """Обмен состоянием метрик между воркерами через файлы в общем каталоге"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, f"stats-{name}-{suffix}.json")
+
+    def _write(self, path, state):
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def publish(self, name, state):
+        """Атомарная запись состояния текущего процесса; файл определяется pid и временем запуска"""
+        pid = os.getpid()
+        self._write(self._path(name, f"{pid}-{process_start_time(pid) or 0}"), state)
+
+    def _scan(self, name):
+        """Файлы воркеров: [(path, pid, alive)] без файла завершившихся воркеров"""
+        prefix = f"stats-{name}-"
+        files = []
+        for path in glob.glob(os.path.join(self.directory, f"{prefix}*.json")):
+            suffix = os.path.basename(path)[len(prefix):-len(".json")]
+            if suffix == DEAD_WORKERS:
+                continue
+            try:
+                pid, start_time = (int(part) for part in suffix.split("-"))
+            except ValueError:
+                continue
+            files.append((path, pid, worker_alive(pid, start_time)))
+        return files
+
+    def _compact(self, name, merge):
+        """Перенос счётчиков завершившихся воркеров в один файл"""
+        with open(os.path.join(self.directory, f"stats-{name}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Повторный поиск под блокировкой: другой воркер мог уже всё перенести
+            dead_paths = [path for path, _, alive in self._scan(name) if not alive]
+            if not dead_paths:
+                return
+            dead_path = self._path(name, DEAD_WORKERS)
+            states = [state for state in map(self._read, [dead_path] + dead_paths) if state is not None]
+            self._write(dead_path, merge(states))
+            for path in dead_paths:
+                os.remove(path)
+            logger.info(f"Compacted {len(dead_paths)} {name} stats files of exited workers")
+
+    def collect(self, name, merge):
+        """Состояния живых воркеров и объединённое состояние завершившихся (alive=False)"""
+        files = self._scan(name)
+        if any(not alive for _, _, alive in files):
+            self._compact(name, merge)
+            files = self._scan(name)
+
+        states = []
+        for path, pid, alive in files:
+            state = self._read(path)
+            if state is None or not alive:
+                continue
+            state["pid"] = pid
+            state["alive"] = True
+            states.append(state)
+
+        dead_state = self._read(self._path(name, DEAD_WORKERS))
+        if dead_state is not None:
+            dead_state["alive"] = False
+            states.append(dead_state)
+        return states
+
+    def clear(self):
+        """Удаление только собственных файлов метрик, остальное содержимое каталога не трогается"""
+        for pattern in ("stats-*.json", "stats-*.json.tmp.*", "stats-*.lock"):
+            for path in glob.glob(os.path.join(self.directory, pattern)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class StatsPublisher:
+    """Фоновая периодическая публикация состояния компонентов воркера"""
+
+    def __init__(self, store, sources, interval=5.0):
+        self.store = store
+        self.sources = sources
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stats-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+        self.publish()
+
+    def publish(self):
+        for name, source in self.sources.items():
+            try:
+                self.store.publish(name, source.get_state())
+            except Exception as e:
+                logger.error(f"Failed to publish {name} stats: {str(e)}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.publish()
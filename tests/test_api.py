@@ -1,11 +1,16 @@
 import sys
 import os
+import traceback
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
 
 import pytest
 from fastapi.testclient import TestClient
 from api import app
+from shadow import ShadowScorer
+from model_cache import ModelCache, ModelNotFoundError
+from drift import DriftMonitor, HeavyHitters
+from worker_stats import WorkerStatsStore
 
 client = TestClient(app)
 
@@ -52,6 +57,12 @@ REGRESSION_TEST_DATA = [
 
 REFERENCE_PREDICTIONS = [157, 153]
 
+DRIFT_REFERENCE_PROFILE = {
+    "n_samples": 100,
+    "numerical": {"thickness_mm": {"edges": [1.0, 2.0], "probs": [0.3, 0.4, 0.3]}},
+    "categorical": {"material": {"frequencies": {"steel": 0.5, "aluminum": 0.5}}},
+}
+
 def test_no_regression():
     """
     Тест на отсутствие регрессии.
@@ -218,6 +229,225 @@ def test_missing_fields():
     response = client.post("/predict", json=incomplete_data)
     assert response.status_code == 422  # Ошибка валидации
 
+def test_shadow_stats():
+    """Тест эндпоинта статистики теневого скоринга"""
+    response = client.get("/shadow/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert "enabled" in data
+    if data["enabled"]:
+        assert "mape_divergence" in data
+        assert "scored" in data
+
+def test_shadow_scorer_divergence():
+    """Тест накопления расхождения challenger модели"""
+    class ConstantModel:
+        def predict(self, X, thread_count=-1):
+            return [110.0] * len(X)
+
+    scorer = ShadowScorer(ConstantModel(), sample_rate=1.0, batch_size=4, flush_interval=0.05)
+    for test_data in REGRESSION_TEST_DATA:
+        scorer.submit(test_data, 100.0)
+    scorer.stop()
+
+    stats = scorer.get_stats()
+    assert stats["scored"] == len(REGRESSION_TEST_DATA)
+    assert stats["mape_divergence"] == pytest.approx(10.0)
+    assert stats["mean_pct_bias"] == pytest.approx(10.0)
+
+def test_predict_by_model():
+    """Тест эндпоинта предсказания выбранной моделью"""
+    response = client.post("/predict/price_predict", json=REGRESSION_TEST_DATA[0])
+    assert response.status_code in [200, 404, 503]
+    if response.status_code == 200:
+        assert response.json()["prediction"] >= 0
+
+        stats = client.get("/models").json()
+        assert stats["models"]["price_predict@production"]["requests"] >= 1
+
+def test_predict_by_unknown_model():
+    """Тест запроса к несуществующей модели: без роста метрик по моделям"""
+    models_before = set(client.get("/models").json()["models"])
+
+    response = client.post("/predict/no_such_model", json=REGRESSION_TEST_DATA[0])
+    # 503, если сервер MLflow недоступен
+    assert response.status_code in [404, 503]
+
+    stats = client.get("/models").json()
+    assert set(stats["models"]) == models_before
+    assert stats["rejected_requests"] >= 1
+
+def test_model_cache_single_flight_and_eviction():
+    """Тест однократной загрузки при конкурентных запросах и LRU вытеснения"""
+    import threading
+    import time
+
+    calls = []
+
+    def slow_loader(model_name, alias):
+        calls.append((model_name, alias))
+        time.sleep(0.1)
+        return f"{model_name}@{alias}"
+
+    cache = ModelCache(slow_loader, max_bytes=2, size_fn=lambda model: 1)
+
+    threads = [threading.Thread(target=cache.get, args=("a", "production")) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [("a", "production")]
+
+    cache.get("b", "production")
+    cache.get("a", "production")
+    cache.get("c", "production")  # вытесняет b как наименее используемую
+
+    cached = {item["model_name"] for item in cache.get_stats()["cached"]}
+    assert cached == {"a", "c"}
+    assert cache.get_stats()["models"]["b@production"]["evictions"] == 1
+
+def test_model_cache_negative_cache():
+    """Тест кэширования неудачных загрузок без заведения метрик"""
+    calls = []
+
+    def failing_loader(model_name, alias):
+        calls.append(model_name)
+        raise ModelNotFoundError(f"Model {model_name}@{alias} not found")
+
+    cache = ModelCache(failing_loader, max_bytes=10, failure_ttl=60, max_failures=2)
+    errors = []
+    for _ in range(3):
+        with pytest.raises(ModelNotFoundError) as exc_info:
+            cache.get("missing", "production")
+        errors.append(exc_info.value)
+    assert calls == ["missing"]
+    # Каждое попадание в негативный кэш - новый экземпляр с коротким traceback
+    assert errors[1] is not errors[2]
+    assert len(traceback.extract_tb(errors[2].__traceback__)) <= 2
+
+    for name in ["x", "y", "z"]:
+        with pytest.raises(ModelNotFoundError):
+            cache.get(name, "production")
+        cache.record_request(name, "production", 1.0, error=True)
+
+    stats = cache.get_stats()
+    assert stats["models"] == {}
+    assert stats["load_errors"] == 4
+    assert stats["negative_cache_hits"] == 2
+    assert stats["rejected_requests"] == 3
+    assert len(cache._failures) == 2
+
+def test_model_cache_pinned_model():
+    """Тест закреплённой модели: без загрузки и без учёта в бюджете"""
+    cache = ModelCache(lambda name, alias: pytest.fail("loader must not be called"), max_bytes=0)
+    cache.pin("price_predict", "production", "model")
+
+    assert cache.get("price_predict", "production") == "model"
+    stats = cache.get_stats()
+    assert stats["total_bytes"] == 0
+    assert stats["models"]["price_predict@production"]["hits"] == 1
+
+def test_drift():
+    """Тест эндпоинта мониторинга дрейфа"""
+    response = client.get("/drift")
+    assert response.status_code == 200
+    data = response.json()
+    assert "enabled" in data
+    if data["enabled"]:
+        assert "numerical" in data
+        assert "categorical" in data
+
+def test_drift_monitor_detects_shift():
+    """Тест обнаружения сдвига числового признака и новой категории"""
+    monitor = DriftMonitor(DRIFT_REFERENCE_PROFILE, batch_size=8)
+
+    for _ in range(50):
+        monitor.observe({"thickness_mm": 5.0, "material": "titanium"})
+
+    result = monitor.get_drift()
+    assert result["observed"] == 50
+    assert result["numerical"]["thickness_mm"]["drift"] == "significant"
+    assert result["categorical"]["material"]["unseen_share"] == 1.0
+    assert "titanium" in result["categorical"]["material"]["unseen_top"]
+    assert result["drift"] == "significant"
+
+def test_drift_monitor_skips_invalid_rows():
+    """Тест пропуска некорректных строк без рассогласования счётчиков"""
+    monitor = DriftMonitor(DRIFT_REFERENCE_PROFILE, batch_size=4)
+    monitor.observe({"thickness_mm": 1.5, "material": "steel"})
+    monitor.observe({"thickness_mm": "thick", "material": "steel"})
+    monitor.observe({"thickness_mm": float("nan"), "material": "aluminum"})
+    monitor.observe({"thickness_mm": 0.5, "material": "aluminum"})
+
+    result = monitor.get_drift()
+    assert result["observed"] == 2
+    assert result["skipped"] == 2
+    assert monitor._num_counts["thickness_mm"].sum() == 2
+    assert sum(monitor._cat_counts["material"].values()) == 2
+
+def test_heavy_hitters_bounded():
+    """Тест ограниченного числа счётчиков heavy hitters"""
+    hitters = HeavyHitters(k=2)
+    for value in ["a"] * 10 + ["b", "c", "d", "e"]:
+        hitters.update(value)
+    assert len(hitters.counters) <= 2
+    assert hitters.top(1)[0][0] == "a"
+
+def test_worker_stats_merge(tmp_path):
+    """Тест объединения статистик теневого скоринга нескольких воркеров"""
+    class ConstantModel:
+        def predict(self, X, thread_count=-1):
+            return [110.0] * len(X)
+
+    store = WorkerStatsStore(str(tmp_path))
+    scorer = ShadowScorer(ConstantModel(), sample_rate=1.0, batch_size=4, flush_interval=0.05)
+    scorer.submit(REGRESSION_TEST_DATA[0], 100.0)
+    scorer.stop()
+    store.publish("shadow", scorer.get_state())
+
+    states = store.collect("shadow", scorer.merge_states)
+    assert len(states) == 1 and states[0]["alive"]
+
+    # Второй воркер с тем же числом расхождений, но 20%
+    other = {**states[0], "abs_pct_sum": 20.0, "pct_sum": -20.0, "max_abs_pct": 20.0, "alive": False}
+    stats = scorer.stats_from_states(states + [other])
+    assert stats["workers"] == 1
+    assert stats["scored"] == 2
+    assert stats["mape_divergence"] == pytest.approx(15.0)
+    assert stats["max_abs_pct_divergence"] == pytest.approx(20.0)
+
+def test_worker_stats_compacts_dead_workers(tmp_path):
+    """Тест переноса счётчиков завершившихся воркеров в один файл"""
+    def merge(states):
+        return {"count": sum(state["count"] for state in states)}
+
+    store = WorkerStatsStore(str(tmp_path))
+    store.publish("shadow", {"count": 1})
+    # Файлы завершившихся воркеров и воркера с переиспользованным pid
+    (tmp_path / "stats-shadow-999999999-1.json").write_text('{"count": 2}')
+    (tmp_path / f"stats-shadow-{os.getpid()}-1.json").write_text('{"count": 3}')
+
+    states = store.collect("shadow", merge)
+    assert sorted((state["alive"], state["count"]) for state in states) == [(False, 5), (True, 1)]
+    assert len(list(tmp_path.glob("stats-shadow-*.json"))) == 2
+
+    (tmp_path / "stats-shadow-999999998-1.json").write_text('{"count": 4}')
+    states = store.collect("shadow", merge)
+    assert sorted((state["alive"], state["count"]) for state in states) == [(False, 9), (True, 1)]
+
+    store.clear()
+    assert list(tmp_path.glob("stats-*")) == []
+
+def test_drift_monitor_merge():
+    """Тест объединения состояний дрейфа нескольких воркеров"""
+    first, second = DriftMonitor(DRIFT_REFERENCE_PROFILE), DriftMonitor(DRIFT_REFERENCE_PROFILE)
+    first.observe({"thickness_mm": 1.5, "material": "steel"})
+    second.observe({"thickness_mm": 5.0, "material": "titanium"})
+
+    result = first.drift_from_states([first.get_state(), second.get_state()])
+    assert result["observed"] == 2
+    assert result["categorical"]["material"]["unseen_top"] == {"titanium": 1}
+
 
 # if __name__ == "__main__":
 #     # import uvicorn